@@ -1,10 +1,13 @@
 # -*- coding: utf-8 -*-
 # ごはんの神様に相談だ！ / Streamlit App（信頼DB照合・安全弁つき）
 from __future__ import annotations
-import os, re, json, math, random
+import os, re, math, random
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from typing import List, Optional, Dict, Tuple
 
 import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 from pydantic import BaseModel, Field
 
 # ------------------------------------------------------------
@@ -23,6 +26,7 @@ FEATURES = {
     "SHOW_DEBUG_PANEL": IS_DEV,
     "TEMPERATURE": 0.4 if not IS_DEV else 0.6,
     "WEEK_REPLAN_ATTEMPTS": 2,
+    "LLM_CONCURRENCY": 8,               # 週プランの同時生成数
 }
 
 # ============================================================
@@ -58,13 +62,30 @@ class DayPlan(BaseModel):
 # 正規化ユーティリティ
 # ============================================================
 _STEP_PREFIX_RE = re.compile(r"^\s*(?:STEP\s*\d+[:：\-\s]*|\d+[\.．、\)）]\s*|[①-⑳]\s*)")
+@lru_cache(maxsize=4096)
 def strip_step_prefix(text: str) -> str:
     return _STEP_PREFIX_RE.sub('', text or '').strip()
 
+# 全角数字・記号 → 半角（正規表現の前に1パスで寄せる）
+_FW_TRANS = str.maketrans(
+    {chr(0xFF10 + i): str(i) for i in range(10)}
+    | {"．": ".", "，": ",", "ｇ": "g", "ｋ": "k", "ｍ": "m", "ｌ": "l", "Ｌ": "L", "ｃ": "c"}
+)
+
 TSP_IN_TBSP = 3.0
 _num_re = re.compile(r'([0-9]+(?:\.[0-9]+)?)')
 def _has_number(s: str) -> bool: return bool(_num_re.search(s or ""))
 
+# 単位パース用（呼び出しごとの re キャッシュ参照を避けて事前コンパイル）
+_MULTISPACE_RE = re.compile(r'\s{2,}')
+_LIST_SEP_RE = re.compile(r"[、,]")
+_TBSP_RE = re.compile(r'大さじ\s*(\d+(?:\.\d+)?)')
+_TSP_RE = re.compile(r'小さじ\s*(\d+(?:\.\d+)?)')
+_ML_RE = re.compile(r'(\d+(?:\.\d+)?)\s*(?:ml|mL|cc)')
+_G_RE = re.compile(r'(\d+(?:\.\d+)?)\s*(?:g|グラム)')
+_CUP_RE = re.compile(r'(\d+(?:\.\d+)?)\s*カップ')
+_COUNT_RE = re.compile(r'(\d+(?:\.\d+)?)\s*個')
+
 def _round_tsp_to_pretty(tsp: float) -> str:
     if tsp <= 0.15: return "少々"
     tbsp = tsp / TSP_IN_TBSP
@@ -83,7 +104,7 @@ def _grams_to_pretty(g: int) -> str:
 
 def sanitize_amount(amount: Optional[str]) -> Optional[str]:
     if not amount: return None
-    a = amount.strip().replace("．", ".").replace(".0", "")
+    a = amount.translate(_FW_TRANS).strip().replace(".0", "")
     if a in {"小さじ0","大さじ0","0g","0個","0片","0枚","0本","0cc","0ml"}: return "少々"
     return a
 
@@ -95,12 +116,13 @@ _QTY_IN_NAME_RE = re.compile(
     r'|少々|適量'
     r')(?=\s|$)'
 )
+@lru_cache(maxsize=4096)
 def split_quantity_from_name(name: str) -> tuple[str, Optional[str]]:
-    txt = name or ""
+    txt = (name or "").translate(_FW_TRANS)
     m = _QTY_IN_NAME_RE.search(txt)
     qty = m.group(1) if m else None
     base = _QTY_IN_NAME_RE.sub(" ", txt).strip()
-    base = re.sub(r'\s{2,}', ' ', base)
+    base = _MULTISPACE_RE.sub(' ', base)
     return (base or txt), qty
 
 # 既定量（材料名から推定）
@@ -109,32 +131,51 @@ VEG_G_PER_SERV = {"玉ねぎ":50,"ねぎ":10,"長ねぎ":20,"キャベツ":80,"
 COND_TSP_PER_SERV = {"塩":0.125,"砂糖":0.5,"しょうゆ":1.0,"醤油":1.0,"みりん":1.0,"酒":1.0,"酢":1.0,"コチュジャン":0.5,"味噌":1.5,"顆粒だし":0.5}
 OIL_TSP_PER_SERV = {"サラダ油":1.0,"ごま油":0.5,"オリーブオイル":1.0}
 PIECE_PER_SERV = {"卵":"1個","にんにく":"0.5片","生姜":"0.5片"}
+# 個数系は (1人前の数値, 単位) に事前分解しておく
+_PIECE_PRECOMP = {k: (float(_num_re.search(v).group(1)), _num_re.sub("", v).strip()) for k, v in PIECE_PER_SERV.items()}
+
+def _keyword_re(keys) -> re.Pattern:
+    # 長いキーを先に並べる（「ねぎ」が「長ねぎ」を先取りしないように）
+    return re.compile("|".join(map(re.escape, sorted(keys, key=len, reverse=True))))
+
+_PIECE_KEY_RE = _keyword_re(PIECE_PER_SERV)
+_PIECE_RANK = {k: i for i, k in enumerate(PIECE_PER_SERV)}
+
+# 材料名キー → (テーブル優先度, テーブル内の定義順, 種別, 1人前の量)
+# 優先度は たんぱく質 > 野菜 > 油 > 調味料、同じテーブル内は dict の定義順（従来の for ループと同じ）
+_AMOUNT_TABLE: Dict[str, Tuple[int, int, str, float]] = {}
+for _rank, (_kind, _table) in enumerate([("g", PROTEIN_G_PER_SERV), ("g", VEG_G_PER_SERV),
+                                         ("tsp", OIL_TSP_PER_SERV), ("tsp", COND_TSP_PER_SERV)]):
+    for _idx, (_k, _v) in enumerate(_table.items()):
+        _AMOUNT_TABLE.setdefault(_k, (_rank, _idx, _kind, _v))
+_AMOUNT_RE = _keyword_re(_AMOUNT_TABLE)
 SPICY_WORDS = ["一味","七味","豆板醤","コチュジャン","ラー油","唐辛子","粉唐辛子"]
+PEPPER_WORDS = ["胡椒","こしょう","黒胡椒","一味","七味","ラー油"]
+CONDIMENT_WORDS = ["塩","砂糖","しょうゆ","醤油","みりん","酒","味噌","酢","ごま油","オリーブオイル","油","バター","だし","顆粒だし","コンソメ","ブイヨン"]
+_SPICY_RE = _keyword_re(SPICY_WORDS)
+_PEPPER_RE = _keyword_re(PEPPER_WORDS)
+_CONDIMENT_RE = _keyword_re(CONDIMENT_WORDS)
 
 def _guess_amount(name: str, servings: int) -> str:
-    for key, per in PIECE_PER_SERV.items():
-        if key in name:
-            m = _num_re.search(per); num = float(m.group(1)) if m else 1.0
-            unit = per.replace(str(num).rstrip('0').rstrip('.'), '')
-            total = num * servings
-            return f"{int(total) if abs(total-int(total))<1e-6 else total:g}{unit}"
-    for key, g in PROTEIN_G_PER_SERV.items():
-        if key in name: return _grams_to_pretty(int(g*servings))
-    for key, g in VEG_G_PER_SERV.items():
-        if key in name: return _grams_to_pretty(int(g*servings))
-    for key, tsp in OIL_TSP_PER_SERV.items():
-        if key in name: return _round_tsp_to_pretty(tsp*servings)
-    for key, tsp in COND_TSP_PER_SERV.items():
-        if key in name: return _round_tsp_to_pretty(tsp*servings)
-    if any(k in name for k in ["胡椒","こしょう","黒胡椒","一味","七味","ラー油"]): return "少々"
+    # 複数ヒット時は PIECE_PER_SERV の定義順で先のキーを採用（「にんにく卵」→ 卵）
+    key = min((m.group(0) for m in _PIECE_KEY_RE.finditer(name)), key=_PIECE_RANK.__getitem__, default=None)
+    if key:
+        num, unit = _PIECE_PRECOMP[key]
+        total = num * servings
+        return f"{int(total)}{unit}" if total.is_integer() else f"{total:g}{unit}"
+    # 1回の走査で全テーブルのヒットを拾い、(テーブル優先度, テーブル内の定義順) が最小のキーを採用
+    hits = [_AMOUNT_TABLE[m.group(0)] for m in _AMOUNT_RE.finditer(name)]
+    if hits:
+        _, _, kind, per = min(hits)
+        return _grams_to_pretty(int(per*servings)) if kind=="g" else _round_tsp_to_pretty(per*servings)
+    if _PEPPER_RE.search(name): return "少々"
     return "適量"
 
 def normalize_ingredients(ings: List[Ingredient], servings: int, child_mode: bool=False, child_factor: float=0.8) -> List[Ingredient]:
     def is_condiment(nm:str)->bool:
-        KEYS=["塩","砂糖","しょうゆ","醤油","みりん","酒","味噌","酢","ごま油","オリーブオイル","油","バター","だし","顆粒だし","コンソメ","ブイヨン"]
-        return any(k in nm for k in KEYS)
+        return bool(_CONDIMENT_RE.search(nm))
     def is_spicy(nm:str)->bool:
-        return any(k in nm for k in SPICY_WORDS)
+        return bool(_SPICY_RE.search(nm))
 
     fixed: List[Ingredient] = []
     for it in ings:
@@ -151,11 +192,11 @@ def normalize_ingredients(ings: List[Ingredient], servings: int, child_mode: boo
                 # 小さじ/大さじ/g に限って減らす
                 def to_unit_val(a:str)->tuple[str,float]:
                     a=a.replace("．",".")
-                    m=re.search(r'大さじ\s*(\d+(?:\.\d+)?)',a);   # tbsp
+                    m=_TBSP_RE.search(a);   # tbsp
                     if m: return ("tbsp", float(m.group(1)))
-                    m=re.search(r'小さじ\s*(\d+(?:\.\d+)?)',a);   # tsp
+                    m=_TSP_RE.search(a);    # tsp
                     if m: return ("tsp", float(m.group(1)))
-                    m=re.search(r'(\d+(?:\.\d+)?)\s*g',a);        # g
+                    m=_G_RE.search(a);      # g
                     if m: return ("g", float(m.group(1)))
                     return ("",0.0)
                 def from_unit_val(u,v)->str:
@@ -166,9 +207,10 @@ def normalize_ingredients(ings: List[Ingredient], servings: int, child_mode: boo
                 u,v = to_unit_val(amt); 
                 if v>0: amt = from_unit_val(u, v*child_factor)
 
-        fixed.append(Ingredient(name=base_name, amount=amt,
-                                is_optional=getattr(it,"is_optional",False),
-                                substitution=getattr(it,"substitution",None)))
+        # 値はすべてこの関数内で整形済み（str/bool/既存値）なので再検証せずに組み立てる
+        fixed.append(Ingredient.model_construct(name=base_name, amount=amt,
+                                                is_optional=getattr(it,"is_optional",False),
+                                                substitution=getattr(it,"substitution",None)))
     return fixed
 
 # ============================================================
@@ -177,17 +219,17 @@ def normalize_ingredients(ings: List[Ingredient], servings: int, child_mode: boo
 def amount_to_unit_val(amount: str) -> tuple[str, float]:
     if not amount: return ("", 0.0)
     a = amount.replace("．",".").strip().lower()
-    m = re.search(r'大さじ\s*(\d+(?:\.\d+)?)', a)
+    m = _TBSP_RE.search(a)
     if m: return ("tbsp", float(m.group(1)))
-    m = re.search(r'小さじ\s*(\d+(?:\.\d+)?)', a)
+    m = _TSP_RE.search(a)
     if m: return ("tsp", float(m.group(1)))
-    m = re.search(r'(\d+(?:\.\d+)?)\s*(?:ml|mL|cc)', a)
+    m = _ML_RE.search(a)
     if m: return ("ml", float(m.group(1)))
-    m = re.search(r'(\d+(?:\.\d+)?)\s*(?:g|グラム)', a)
+    m = _G_RE.search(a)
     if m: return ("g", float(m.group(1)))
-    m = re.search(r'(\d+(?:\.\d+)?)\s*カップ', a)
+    m = _CUP_RE.search(a)
     if m: return ("ml", float(m.group(1))*200.0)  # 日本の計量カップ200ml前提
-    m = re.search(r'(\d+(?:\.\d+)?)\s*個', a)
+    m = _COUNT_RE.search(a)
     if m: return ("piece", float(m.group(1)))
     return ("", 0.0)
 
@@ -237,6 +279,12 @@ FOODS = {
     "オリーブオイル":{"kcal":111,"protein_g":0,"fat_g":12.6,"carb_g":0,"salt_g":0,"yen_per_tbsp":20},
 }
 
+_FOODS_RANK = {k: i for i, k in enumerate(FOODS)}
+_FOODS_RE = _keyword_re(FOODS)
+def _food_key(name: str) -> Optional[str]:
+    # 1回の走査で候補を拾い、FOODS の定義順で先のキーを採用（従来の for ループと同じ優先度）
+    return min((m.group(0) for m in _FOODS_RE.finditer(name)), key=_FOODS_RANK.__getitem__, default=None)
+
 def tbsp_from_tsp(x: float) -> float: return x/3.0
 
 def estimate_nutrition(rec) -> dict:
@@ -244,9 +292,7 @@ def estimate_nutrition(rec) -> dict:
     for ing in rec.ingredients:
         name = ing.name; amt_str = ing.amount or ""
         unit, val = amount_to_unit_val(amt_str)
-        key=None
-        for k in FOODS.keys():
-            if k in name: key=k; break
+        key = _food_key(name)
         if not key: continue
         base = FOODS[key].copy()
         factor=0.0
@@ -284,9 +330,7 @@ def estimate_cost_yen(rec: Recipe, price_factor: float = 1.0) -> int:
     for ing in rec.ingredients:
         name = ing.name; amt = ing.amount or ""
         unit, val = amount_to_unit_val(amt)
-        key=None
-        for k in FOODS.keys():
-            if k in name: key=k; break
+        key = _food_key(name)
         if not key:
             if unit=="g": total += (val/100.0)*30*price_factor
             elif unit=="ml": total += (val/100.0)*20*price_factor
@@ -325,15 +369,17 @@ def estimate_cost_yen(rec: Recipe, price_factor: float = 1.0) -> int:
 # ============================================================
 HEAT_WORDS = ["弱火","中火","強火","沸騰","余熱","レンジ","600W","500W"]
 SEASONINGS = ["塩","砂糖","しょうゆ","醤油","みりん","酒","味噌","酢","ごま油","オリーブオイル","バター","だし","顆粒だし","コンソメ","ブイヨン"]
+_HEAT_RE = _keyword_re(HEAT_WORDS)
+_SEASONING_RE = _keyword_re(SEASONINGS)
 def quality_check(rec) -> tuple[bool, List[str]]:
     warns=[]
     if len(rec.ingredients)<3: warns.append("材料が少なすぎます（3品以上推奨）")
     if len(rec.steps)<3: warns.append("手順が少なすぎます（3ステップ以上推奨）")
     step_text="。".join([s.text for s in rec.steps])
-    if not any(w in step_text for w in HEAT_WORDS):
+    if not _HEAT_RE.search(step_text):
         warns.append("加熱の記述がありません（弱火/中火/強火/レンジ）")
     ing_txt="、".join([f"{i.name} {i.amount or ''}" for i in rec.ingredients])
-    if not any(s in ing_txt for s in SEASONINGS):
+    if not _SEASONING_RE.search(ing_txt):
         warns.append("基本調味が不足（塩・しょうゆ等）")
     if "適量" in ing_txt:
         warns.append("“適量”が含まれています（できるだけ数量表記に）")
@@ -487,15 +533,42 @@ def apply_trust_safety(rec: Recipe) -> tuple[Recipe, List[str], List[str]]:
         badges.insert(0, "信頼DBで補強済")
     return rec, badges, notes
 
+def finalize_recipe(rec: Recipe, servings: int, child_mode: bool) -> tuple[Recipe, List[str], List[str]]:
+    """
+    人数合わせ → 材料の正規化 → 信頼DB補強 を1か所で行う（表示側では再正規化しない）
+    return: (確定レシピ, バッジ, 補強メモ)
+    """
+    rec.servings = servings
+    rec.ingredients = normalize_ingredients(rec.ingredients, rec.servings, child_mode)
+    if FEATURES["ENABLE_TRUST_DB_SAFETY"]:
+        return apply_trust_safety(rec)
+    return rec, [], []
+
 # ============================================================
 # OpenAI呼び出し（フォールバックあり）
 # ============================================================
 USE_OPENAI = True
-try:
-    from openai import OpenAI
-    _client = OpenAI() if (USE_OPENAI and (os.getenv("OPENAI_API_KEY") or st.secrets.get("OPENAI_API_KEY"))) else None
-except Exception:
-    _client = None
+
+@st.cache_resource(show_spinner=False)
+def _build_openai_client(api_key: str):
+    """成功したクライアントだけをキャッシュする（失敗時は例外＝キャッシュされず次回再試行）"""
+    import httpx
+    from openai import OpenAI, DefaultHttpxClient
+    # 週プランの並列生成数ぶん keep-alive 接続を確保し、スレッド間で温まった接続を共有する
+    n = FEATURES["LLM_CONCURRENCY"]
+    limits = httpx.Limits(max_connections=2*n, max_keepalive_connections=n)
+    return OpenAI(api_key=api_key, http_client=DefaultHttpxClient(limits=limits))
+
+def get_openai_client():
+    """キーの有無は毎回確認し、再実行ごとに作り直さずプロセス内で1つのクライアント（接続プール）を使い回す"""
+    try:
+        api_key = os.getenv("OPENAI_API_KEY") or st.secrets.get("OPENAI_API_KEY")
+        if not (USE_OPENAI and api_key): return None
+        return _build_openai_client(api_key)
+    except Exception:
+        return None
+
+_client = get_openai_client()
 
 PROMPT_TMPL = (
     "You are a helpful Japanese cooking assistant.\n"
@@ -507,6 +580,74 @@ PROMPT_TMPL = (
     "Avoid '適量' if possible; prefer g/ml/大さじ/小さじ. Include heat levels.\n"
 )
 
+# 構造化出力：RecipeSet のスキーマをそのまま渡し、初回から検証を通る形で返させる。
+# strict=True は全項目必須・既定値なしが条件でモデル定義と合わないため、非strictで誘導のみ（検証は従来どおり）。
+RECIPE_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {"name": "RecipeSet", "schema": RecipeSet.model_json_schema()},
+}
+
+def _canonical_terms(items: List[str]) -> Tuple[str, ...]:
+    """キャッシュキー用：全角→半角・大小文字・空白・重複・並び順を無視（「卵, 鶏肉」と「鶏肉,卵,卵」を同一視）"""
+    return tuple(sorted({t for t in (x.translate(_FW_TRANS).strip().casefold() for x in items) if t}))
+
+@st.cache_data(show_spinner=False, max_entries=64, ttl=3600)
+def _llm_recipes(
+    ingredients: Tuple[str, ...],
+    servings: int,
+    theme: str,
+    genre: str,
+    max_minutes: int,
+    want_keyword: str,
+    avoid_keywords: Tuple[str, ...],
+    child_mode: bool,
+    variant: int = 0,
+    _show_progress: bool = False,
+) -> RecipeSet:
+    """
+    同じ入力の再送信ではLLMを呼ばずキャッシュを返す。
+    失敗時は例外をそのまま投げる（キャッシュされず、フォールバック表示は呼び出し側）。
+    variant: 同じ入力でも別案が欲しいときに変える（キャッシュキーにのみ効く）
+    _show_progress: ストリーミング受信中の進捗を表示（キャッシュキーには含めない）
+    """
+    theme_line = f"テーマ: {theme}\n" if theme else ""
+    genre_line = f"ジャンル: {genre}\n" if genre else ""
+    child_line = "子ども配慮: はい（辛味抜き・塩分-20%・一口大）\n" if child_mode else ""
+    want_line  = ("希望: " + want_keyword) if want_keyword else "希望: なし"
+    avoid_line = ("除外: " + ", ".join(avoid_keywords)) if avoid_keywords else "除外: なし"
+    user_msg = (
+        f"食材: {', '.join(ingredients) if ingredients else '（未指定）'}\n"
+        f"人数: {servings}人\n"
+        f"{theme_line}{genre_line}{child_line}"
+        f"最大調理時間: {max_minutes}分\n"
+        f"{want_line}\n{avoid_line}\n"
+    )
+    stream = _client.chat.completions.create(
+        model="gpt-4o-mini",
+        temperature=FEATURES["TEMPERATURE"],
+        response_format=RECIPE_RESPONSE_FORMAT,
+        messages=[{"role":"system","content":PROMPT_TMPL},
+                  {"role":"user","content":user_msg}],
+        stream=True,
+    )
+    # 受信しながら進捗を出し、無反応に見える待ち時間を減らす（表示はこの関数内で作って消す＝キャッシュ再生と両立）
+    progress = st.empty() if _show_progress else None
+    buf: List[str] = []; n_chars = 0
+    try:
+        for chunk in stream:
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if not delta: continue
+            buf.append(delta)
+            if progress is not None and (n_chars + len(delta)) // 200 != n_chars // 200:
+                progress.caption(f"✍️ レシピを生成中…（{n_chars + len(delta)}文字）")
+            n_chars += len(delta)
+    finally:
+        # 途中で切断・タイムアウトしても進捗表示を残さない
+        if progress is not None: progress.empty()
+    text = "".join(buf) or "{}"
+    # 文字列のまま pydantic-core に渡し、json.loads → dict 検証の二度手間を省く
+    return RecipeSet.model_validate_json(text)
+
 def generate_recipes(
     ingredients: List[str],
     servings: int,
@@ -516,31 +657,15 @@ def generate_recipes(
     want_keyword: str = "",
     avoid_keywords: List[str] | None = None,
     child_mode: bool = False,
+    show_progress: bool = False,
+    variant: int = 0,
 ) -> RecipeSet:
     avoid_keywords = avoid_keywords or []
     if _client is not None:
         try:
-            theme_line = f"テーマ: {theme}\n" if theme else ""
-            genre_line = f"ジャンル: {genre}\n" if genre else ""
-            child_line = "子ども配慮: はい（辛味抜き・塩分-20%・一口大）\n" if child_mode else ""
-            want_line  = ("希望: " + want_keyword) if want_keyword else "希望: なし"
-            avoid_line = ("除外: " + ", ".join(avoid_keywords)) if avoid_keywords else "除外: なし"
-            user_msg = (
-                f"食材: {', '.join(ingredients) if ingredients else '（未指定）'}\n"
-                f"人数: {servings}人\n"
-                f"{theme_line}{genre_line}{child_line}"
-                f"最大調理時間: {max_minutes}分\n"
-                f"{want_line}\n{avoid_line}\n"
-            )
-            resp = _client.chat.completions.create(
-                model="gpt-4o-mini",
-                temperature=FEATURES["TEMPERATURE"],
-                messages=[{"role":"system","content":PROMPT_TMPL},
-                          {"role":"user","content":user_msg}],
-            )
-            text = resp.choices[0].message.content or "{}"
-            data = json.loads(text)
-            return RecipeSet.model_validate(data)
+            return _llm_recipes(_canonical_terms(ingredients), int(servings), theme, genre, int(max_minutes),
+                                want_keyword.translate(_FW_TRANS).strip().casefold(), _canonical_terms(avoid_keywords), child_mode,
+                                variant, _show_progress=show_progress)
         except Exception as e:
             st.info(f"LLMの構造化生成に失敗したためフォールバックします: {e}")
 
@@ -560,21 +685,23 @@ def plan_week(num_days:int, budget_yen:int, servings:int, theme:str, genre:str,
               price_factor:float, child_mode:bool, want_keyword:str, avoid_keywords:List[str],
               nutri_profile:str) -> tuple[List[DayPlan], int]:
     plans=[]
-    for i in range(num_days):
-        hint = PROTEIN_ROTATION[i%len(PROTEIN_ROTATION)]
-        data = generate_recipes([hint], servings, theme, genre, max_minutes, want_keyword, avoid_keywords, child_mode)
+    hints = [PROTEIN_ROTATION[i%len(PROTEIN_ROTATION)] for i in range(num_days)]
+    def _gen(hint: str) -> RecipeSet:
+        return generate_recipes([hint], servings, theme, genre, max_minutes, want_keyword, avoid_keywords, child_mode)
+    # 日ごとの生成は独立なので並列に投げる（st.info が使えるようスレッドにコンテキストを渡す）
+    workers = max(1, min(len(hints), FEATURES["LLM_CONCURRENCY"]))
+    with ThreadPoolExecutor(max_workers=workers, initializer=add_script_run_ctx, initargs=(None, get_script_run_ctx())) as ex:
+        results = list(ex.map(_gen, hints))
+    for i, data in enumerate(results):
         recs = data.recommendations or []
         if FEATURES["ENABLE_QUALITY_FILTER"]:
             if want_keyword:
-                matched=[r for r in recs if want_keyword.lower() in r.recipe_title.lower()]
-                recs = matched + [r for r in recs if r not in matched]
+                # 1パスで振り分け（`r not in matched` はモデル同士の深い比較になるため使わない）
+                kw = want_keyword.lower(); matched=[]; rest=[]
+                for r in recs: (matched if kw in r.recipe_title.lower() else rest).append(r)
+                recs = matched + rest
         if not recs: continue
-        r = recs[0]
-        r.servings = servings
-        r.ingredients = normalize_ingredients(r.ingredients, r.servings, child_mode)
-        # ★ 信頼DBで補強
-        if FEATURES["ENABLE_TRUST_DB_SAFETY"]:
-            r, badges, notes = apply_trust_safety(r)
+        r, _, _ = finalize_recipe(recs[0], servings, child_mode)
         est_cost = estimate_cost_yen(r, price_factor)
         plans.append(DayPlan(day_index=i+1, recipe=r, est_cost=est_cost))
     total_cost = sum(p.est_cost for p in plans)
@@ -582,29 +709,61 @@ def plan_week(num_days:int, budget_yen:int, servings:int, theme:str, genre:str,
     if total_cost > budget_yen:
         plans.sort(key=lambda x:x.est_cost, reverse=True)
         if plans:
-            data = generate_recipes(["豆腐"], servings, theme, genre, max_minutes, want_keyword, avoid_keywords, child_mode)
-            if data.recommendations:
-                r=data.recommendations[0]
-                r.servings=servings; r.ingredients=normalize_ingredients(r.ingredients, r.servings, child_mode)
-                if FEATURES["ENABLE_TRUST_DB_SAFETY"]:
-                    r,_,_=apply_trust_safety(r)
+            # 日別生成と同じ入力（例: 豆腐の日）だとキャッシュ命中で同じ料理が返るため、variant で別キーにして取り直す
+            def _sig(rec: Recipe) -> tuple:
+                return (rec.recipe_title, tuple(i.name for i in rec.ingredients))
+            seen = {_sig(p.recipe) for p in plans}
+            for attempt in range(1, FEATURES["WEEK_REPLAN_ATTEMPTS"]+1):
+                data = generate_recipes(["豆腐"], servings, theme, genre, max_minutes, want_keyword, avoid_keywords, child_mode,
+                                        variant=attempt)
+                if not data.recommendations: continue
+                r,_,_ = finalize_recipe(data.recommendations[0], servings, child_mode)
+                if _sig(r) in seen: continue   # 既存の日と同じ料理なら差し替えない
                 plans[0]=DayPlan(day_index=plans[0].day_index, recipe=r, est_cost=estimate_cost_yen(r, price_factor))
+                break
         total_cost = sum(p.est_cost for p in plans)
     return plans, total_cost
 
+# ============================================================
+# 表示ヘルパー（1日/1週間で共通）
+# ============================================================
+def render_meta(rec: Recipe, est_cost: int) -> None:
+    meta=[]
+    meta.append(f"**人数:** {rec.servings}人分")
+    if rec.total_time_min: meta.append(f"**目安:** {rec.total_time_min}分")
+    if rec.difficulty: meta.append(f"**難易度:** {rec.difficulty}")
+    meta.append(f"**概算コスト:** 約 {est_cost} 円")
+    st.markdown(" / ".join(meta))
+
+def render_ingredients(rec: Recipe) -> None:
+    # finalize_recipe 済みの材料を前提に、名前・分量はそのまま出す
+    st.markdown("**材料**")
+    for i in rec.ingredients:
+        amt = i.amount or "適量"
+        st.markdown(f"- {i.name} {amt}" + ("（任意）" if i.is_optional else "") + (f" / 代替: {i.substitution}" if i.substitution else ""))
+
+def render_steps(rec: Recipe) -> None:
+    st.markdown("**手順**")
+    for idx, s in enumerate(rec.steps,1):
+        st.markdown(f"**STEP {idx}**　{strip_step_prefix(s.text)}")
+
 # ============================================================
 # UI フォーム
 # ============================================================
+# 表示ラベルは1か所で定義し、分岐はこの定数と比較する（ラベル変更時の取りこぼし防止）
+MODE_DAY, MODE_WEEK = "1日分", "1週間分"
+OMAKASE = "（お任せ）"
+
 with st.form("inputs", clear_on_submit=False, border=True):
-    mode = st.radio("提案範囲", ["1日分","1週間分"], horizontal=True)
+    mode = st.radio("提案範囲", [MODE_DAY, MODE_WEEK], horizontal=True)
     st.text_input("冷蔵庫の食材（カンマ区切り・任意）", key="ingredients", placeholder="例）鶏肉, キャベツ, 玉ねぎ")
     c1,c2,c3 = st.columns([1,1,1])
     with c1: st.slider("人数（合計）", 1, 8, 4, 1, key="servings")
     with c2:
-        themes=["（お任せ）","時短","節約","栄養重視","子ども向け","おもてなし"]
+        themes=[OMAKASE,"時短","節約","栄養重視","子ども向け","おもてなし"]
         st.selectbox("テーマ", themes, index=0, key="theme")
     with c3:
-        genres=["（お任せ）","和風","洋風","中華風","韓国風","エスニック"]
+        genres=[OMAKASE,"和風","洋風","中華風","韓国風","エスニック"]
         st.selectbox("ジャンル", genres, index=0, key="genre")
     st.slider("最大調理時間（分）", 5, 90, 45, 5, key="max_minutes")
     st.text_input("作りたい料理名・キーワード（任意）", key="want_keyword", placeholder="例）クリーム煮、麻婆豆腐")
@@ -612,7 +771,7 @@ with st.form("inputs", clear_on_submit=False, border=True):
     st.checkbox("子ども向け配慮（辛味抜き・塩分ひかえめ）", value=False, key="child_mode")
     st.selectbox("栄養目安プロファイル", list(NUTRI_PROFILES.keys()), index=0, key="nutri_profile")
 
-    if mode=="1週間分":
+    if mode==MODE_WEEK:
         w1,w2 = st.columns([1,1])
         with w1: st.number_input("今週の予算（円）", min_value=1000, step=500, value=8000, key="week_budget")
         with w2:
@@ -626,13 +785,13 @@ if not submitted: st.stop()
 
 # 入力整形
 ing_text = st.session_state.get("ingredients","")
-ingredients_raw = [s for s in (t.strip() for t in re.split(r"[、,]", ing_text)) if s]
-theme = st.session_state.get("theme","");   theme = "" if theme=="（お任せ）" else theme
-genre = st.session_state.get("genre","");   genre = "" if genre=="（お任せ）" else genre
+ingredients_raw = [s for s in (t.strip() for t in _LIST_SEP_RE.split(ing_text)) if s]
+theme = st.session_state.get("theme","");   theme = "" if theme==OMAKASE else theme
+genre = st.session_state.get("genre","");   genre = "" if genre==OMAKASE else genre
 servings = int(st.session_state.get("servings",4))
 max_minutes = int(st.session_state.get("max_minutes",45))
 want_keyword = (st.session_state.get("want_keyword") or "").strip()
-avoid_keywords = [s for s in (t.strip() for t in re.split(r"[、,]", st.session_state.get("avoid_keywords") or "")) if s]
+avoid_keywords = [s for s in (t.strip() for t in _LIST_SEP_RE.split(st.session_state.get("avoid_keywords") or "")) if s]
 child_mode = bool(st.session_state.get("child_mode",False))
 nutri_profile = st.session_state.get("nutri_profile","ふつう")
 price_factor = {"安め":0.9,"ふつう":1.0,"やや高め":1.1,"高め":1.2}.get(st.session_state.get("price_profile","ふつう"),1.0)
@@ -641,19 +800,16 @@ FEATURES["ENABLE_TRUST_DB_SAFETY"] = bool(st.session_state.get("use_trust", True
 # ============================================================
 # 分岐：1日 / 1週間
 # ============================================================
-if mode=="1日分":
-    data = generate_recipes(ingredients_raw, servings, theme, genre, max_minutes, want_keyword, avoid_keywords, child_mode)
+if mode==MODE_DAY:
+    data = generate_recipes(ingredients_raw, servings, theme, genre, max_minutes, want_keyword, avoid_keywords, child_mode,
+                            show_progress=True)
     recs = data.recommendations or []
     if not recs:
         st.warning("候補が作成できませんでした。条件を見直してください。"); st.stop()
 
     for rec in recs:
-        rec.servings = servings
-        rec.ingredients = normalize_ingredients(rec.ingredients, rec.servings, child_mode)
-        # 安全弁：信頼DB補強
-        badges=[]; notes=[]
-        if FEATURES["ENABLE_TRUST_DB_SAFETY"]:
-            rec, badges, notes = apply_trust_safety(rec)
+        # 正規化＋安全弁（信頼DB補強）
+        rec, badges, notes = finalize_recipe(rec, servings, child_mode)
 
         ok,_ = quality_check(rec)
         tools = rec.equipment or []
@@ -663,12 +819,7 @@ if mode=="1日分":
 
         st.divider()
         st.subheader(rec.recipe_title + ("　👨‍👩‍👧" if child_mode else ""))
-        meta=[]
-        meta.append(f"**人数:** {rec.servings}人分")
-        if rec.total_time_min: meta.append(f"**目安:** {rec.total_time_min}分")
-        if rec.difficulty: meta.append(f"**難易度:** {rec.difficulty}")
-        meta.append(f"**概算コスト:** 約 {est_cost} 円")
-        st.markdown(" / ".join(meta))
+        render_meta(rec, est_cost)
 
         if ok: st.success("✅ 一般的な家庭料理として妥当な品質です")
         if badges:
@@ -687,15 +838,9 @@ if mode=="1日分":
                 f"- 塩分: {nutri['salt_g']} g（{score['salt_g']}）"
             )
         with col2:
-            st.markdown("**材料**")
-            for i in rec.ingredients:
-                base,_ = split_quantity_from_name(i.name)
-                amt = sanitize_amount(getattr(i,"amount",None)) or "適量"
-                st.markdown(f"- {base} {amt}" + ("（任意）" if i.is_optional else "") + (f" / 代替: {i.substitution}" if i.substitution else ""))
+            render_ingredients(rec)
 
-        st.markdown("**手順**")
-        for idx, s in enumerate(rec.steps,1):
-            st.markdown(f"**STEP {idx}**　{strip_step_prefix(s.text)}")
+        render_steps(rec)
 
     st.caption("※ 価格と栄養は概算です（地域・季節で±20%以上の差が出ます）。")
     st.stop()
@@ -718,21 +863,10 @@ for p in sorted(plans, key=lambda x:x.day_index):
     rec=p.recipe
     st.divider()
     st.subheader(f"Day {p.day_index}：{rec.recipe_title}")
-    meta=[]
-    meta.append(f"**人数:** {rec.servings}人分")
-    if rec.total_time_min: meta.append(f"**目安:** {rec.total_time_min}分")
-    if rec.difficulty: meta.append(f"**難易度:** {rec.difficulty}")
-    meta.append(f"**概算コスト:** 約 {p.est_cost} 円")
-    st.markdown(" / ".join(meta))
+    render_meta(rec, p.est_cost)
     if rec.equipment: st.markdown("**器具:** " + "、".join(rec.equipment))
     with st.expander("材料・手順を開く"):
-        st.markdown("**材料**")
-        for i in rec.ingredients:
-            base,_ = split_quantity_from_name(i.name)
-            amt = sanitize_amount(getattr(i,"amount",None)) or "適量"
-            st.markdown(f"- {base} {amt}" + ("（任意）" if i.is_optional else "") + (f" / 代替: {i.substitution}" if i.substitution else ""))
-        st.markdown("**手順**")
-        for idx,s in enumerate(rec.steps,1):
-            st.markdown(f"**STEP {idx}**　{strip_step_prefix(s.text)}")
+        render_ingredients(rec)
+        render_steps(rec)
 
 st.caption("※ 価格と栄養は概算です（地域・季節で±20%以上の差が出ます）。")